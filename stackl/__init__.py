@@ -7,11 +7,15 @@ import re
 import pickle
 import json
 import requests
+from requests.adapters import HTTPAdapter, DEFAULT_POOLSIZE
+from concurrent.futures import ThreadPoolExecutor, Future
 from bs4 import BeautifulSoup
 from stackl.errors import LoginError, InvalidOperationError
 from stackl.models import Room, Message
 from stackl.events import Event
 from stackl.wsclient import WSClient
+from stackl.store import MetadataStore
+from stackl.helpers import Helpers, SeenSet, LRUCache
 
 
 VERSION = '0.0.6b0'
@@ -27,6 +31,15 @@ class ChatClient:
                                        location
         :param kwargs['log_level']: an integer, usually one of the logging.* constants such as logging.DEBUG, specifying
                                     the minimum effective log level
+        :param kwargs['metadata_store']: a MetadataStore, or a path to an SQLite database file, in which to persist
+                                         scraped user and room metadata between runs
+        :param kwargs['prefetch_parents']: a boolean; if True, start fetching the parent of every reply received from
+                                           the websocket in the background, so Message.parent is ready when read
+        :param kwargs['message_cache_size']: the maximum number of recent messages to keep in memory for resolving reply
+                                             parents; defaults to 1000
+        :param kwargs['dedup_window']: the number of seconds for which to remember an event and drop further copies of
+                                       it; defaults to 300
+        :param kwargs['dedup_size']: the maximum number of events to remember for deduplication; defaults to 10000
         """
         self.default_server = kwargs.get('default_server') or 'stackexchange.com'
         log_location = kwargs.get('log_location') or StreamHandler(stream=sys.stdout)
@@ -37,12 +50,26 @@ class ChatClient:
         self.session = requests.Session()
         self.session.headers.update({'User-Agent': 'stackl'})
         self.rooms = []
+        self.prefetch_parents = kwargs.get('prefetch_parents') or False
+
+        metadata_store = kwargs.get('metadata_store')
+        if metadata_store is not None:
+            if not isinstance(metadata_store, MetadataStore):
+                metadata_store = MetadataStore(metadata_store)
+            Helpers.use_store(metadata_store)
 
         self._handlers = []
         self._sockets = {}
         self._fkeys = {}
         self._authed_servers = []
         self._ids = {}
+        self._pool_sizes = {}
+        self._message_cache = LRUCache(max_size=kwargs.get('message_cache_size') or 1000)
+        self._message_fetches = {}
+        self._message_fetches_lock = threading.Lock()
+        self._message_fetch_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='message_fetch')
+        self._seen_events = SeenSet(window=kwargs.get('dedup_window') or 300,
+                                    max_size=kwargs.get('dedup_size') or 10000)
 
     def login(self, email, password, **kwargs):
         """
@@ -73,6 +100,14 @@ class ChatClient:
             self._authed_servers = kwargs.get('servers') or [self.default_server]
             return self.session
 
+    @property
+    def suppressed_duplicates(self):
+        """
+        The number of duplicate websocket events that have been dropped instead of being passed to handlers.
+        :return: Integer
+        """
+        return self._seen_events.suppressed
+
     def id(self, server):
         """
         Get the ID of the logged-in user on the specified server.
@@ -88,40 +123,110 @@ class ChatClient:
         :param server: the server on which the room is hosted
         :return: None
         """
+        joined, failures = self._join_rooms([room_id], server, DEFAULT_POOLSIZE)
+        if len(failures) > 0:
+            raise failures[0][1]
+
+    def join_many(self, room_ids, server, max_workers=10):
+        """
+        Join several rooms on the same server at once and start processing events from them. Room pages and history
+        are fetched concurrently, history events are only turned into Event objects when Room.events is read, and all
+        the rooms share a single websocket connection. Rooms that fail to load are logged and skipped.
+        :param room_ids: an iterable of the IDs of the rooms you wish to join
+        :param server: the server on which the rooms are hosted
+        :param max_workers: the maximum number of requests to have in flight at once
+        :return: a list of the Rooms that were joined
+        """
+        joined, failures = self._join_rooms(room_ids, server, max_workers)
+        for room_id, ex in failures:
+            self.logger.error('Failed to join room {} on {}: {!r}'.format(room_id, server, ex))
+
+        return joined
+
+    def _join_rooms(self, room_ids, server, max_workers):
+        """
+        Internal. Does the work for join and join_many. Rooms are only registered once the websocket has been
+        authenticated, so if that fails the error is raised and nothing is changed.
+        :return: a tuple of (list of joined Rooms, list of (room ID, exception) tuples for rooms that failed to load)
+        """
         if server not in self._authed_servers:
             raise InvalidOperationError('Cannot join a room on a host we haven\'t authenticated to!')
 
-        room = Room(server, room_id=room_id)
-        self.rooms.append(room)
+        room_ids = list(room_ids)
+        if len(room_ids) == 0:
+            return [], []
 
-        self.session.get("https://chat.{}/rooms/{}".format(server, room_id), data={'fkey': self._fkeys[server]})
+        if max_workers > self._pool_sizes.get(server, DEFAULT_POOLSIZE):
+            self.session.mount('https://chat.{}'.format(server), HTTPAdapter(pool_maxsize=max_workers))
+            self._pool_sizes[server] = max_workers
 
-        events = self.session.post("https://chat.{}/chats/{}/events".format(server, room_id), data={
-            'fkey': self._fkeys[server],
-            'since': 0,
-            'mode': 'Messages',
-            'msgCount': 100
-        }).json()['events']
+        def fetch_history(room_id):
+            self.session.get("https://chat.{}/rooms/{}".format(server, room_id), data={'fkey': self._fkeys[server]})
 
-        event_data = [Event(x, server, self) for x in events]
-        room.add_events(event_data)
+            response = self.session.post("https://chat.{}/chats/{}/events".format(server, room_id), data={
+                'fkey': self._fkeys[server],
+                'since': 0,
+                'mode': 'Messages',
+                'msgCount': 100
+            })
+            response.raise_for_status()
+            return response.json()['events']
 
-        ws_auth_data = self.session.post("https://chat.{}/ws-auth".format(server), data={
-            'fkey': self._fkeys[server],
-            'roomid': room_id
-        }).json()
+        def fetch_ws_auth(room_id):
+            response = self.session.post("https://chat.{}/ws-auth".format(server), data={
+                'fkey': self._fkeys[server],
+                'roomid': room_id
+            })
+            response.raise_for_status()
+            return response.json()
+
+        loaded = []
+        failures = []
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(room_ids) + 1)) as executor:
+            ws_auth_future = executor.submit(fetch_ws_auth, room_ids[0])
+            history_futures = [executor.submit(fetch_history, room_id) for room_id in room_ids]
+
+            for room_id, future in zip(room_ids, history_futures):
+                try:
+                    loaded.append((room_id, future.result()))
+                except (requests.RequestException, ValueError, KeyError) as ex:
+                    failures.append((room_id, ex))
+
+            if len(loaded) == 0:
+                return [], failures
+
+            try:
+                ws_auth_data = ws_auth_future.result()
+            except (requests.RequestException, ValueError) as ex:
+                self.logger.warning('ws-auth for room {} on {} failed ({!r}); retrying with room {}.'
+                                    .format(room_ids[0], server, ex, loaded[0][0]))
+                ws_auth_data = fetch_ws_auth(loaded[0][0])
+
+        all_events = [x for room_id, events in loaded for x in events]
+        last_event_time = max([x['time_stamp'] for x in all_events], default=0)
+        ws_uri = '{}?l={}'.format(ws_auth_data['url'], last_event_time)
+
+        joined = []
+        for room_id, events in loaded:
+            for event_data in [x for x in events if 'id' in x]:
+                self._seen_events.add(self._event_key(event_data, server))
+
+            room = Helpers.cached(int(room_id), 'rooms', lambda: Room(server, room_id=room_id))
+            room.add_lazy_events(events, lambda event_data: Event(event_data, server, self))
+            if room not in self.rooms:
+                self.rooms.append(room)
+            joined.append(room)
 
         cookie_string = ''
         for cookie in self.session.cookies:
             if cookie.domain == 'chat.{}'.format(server) or cookie.domain == '.{}'.format(server):
                 cookie_string += '{}={};'.format(cookie.name, cookie.value)
 
-        last_event_time = sorted(events, key=lambda x: x['time_stamp'])[-1]['time_stamp']
-        ws_uri = '{}?l={}'.format(ws_auth_data['url'], last_event_time)
         if server in self._sockets and self._sockets[server].open:
             self._sockets[server].close()
 
         self._sockets[server] = WSClient(ws_uri, cookie_string, server, self._on_message)
+        return joined, failures
 
     def send(self, content, room=None, room_id=None, server=None):
         """
@@ -241,7 +346,15 @@ class ChatClient:
         events = [x for s in events for x in s]
 
         for event_data in events:
+            if 'id' in event_data and not self._seen_events.check(self._event_key(event_data, server)):
+                continue
+
             event = Event(event_data, server, self)
+            if hasattr(event, 'message'):
+                self._message_cache.put((server, event.message.id), event.message)
+                if self.prefetch_parents:
+                    event.message.prefetch_parent()
+
             handlers = [x[0] for x in self._handlers
                         if all([k in event_data and event_data[k] == v for k, v in x[1].items()])]
             for handler in handlers:
@@ -250,6 +363,14 @@ class ChatClient:
 
                 threading.Thread(name='handler_runner', target=run_handler).start()
 
+    @staticmethod
+    def _event_key(event_data, server):
+        """
+        Internal. Builds the key used to recognise repeated copies of the same websocket event.
+        :return: tuple
+        """
+        return server, event_data['id'], event_data.get('event_type')
+
     def _chat_post_fkeyed(self, server, path, data=None):
         """
         Sends a POST request to chat to perform an action, automatically inserting the chat server and fkey.
@@ -263,13 +384,77 @@ class ChatClient:
         return self.session.post('https://chat.{}{}'.format(server, path), data=req_data)
 
     def get_message(self, message_id, server):
+        """
+        Get a message from its transcript page.
+        :param message_id: the ID of the message to get
+        :param server: the server on which the message was posted
+        :return: Message, or None if the message doesn't exist or can't be read (e.g. it has been deleted)
+        """
         soup = BeautifulSoup(self.session.get('https://chat.{}/transcript/message/{}'.format(server, message_id)).text,
                              'html.parser')
-        message = soup.select('#message-{}'.format(message_id))
-        user_id = re.match(r'/users/(\d+)', message.parent.parent.select('.signature .username a')[0].get('href'))[1]
-        room_id = re.match(r'/rooms/(\d+)', soup.select('.room-name a')[0].get('href'))[1]
+        message = soup.select_one('#message-{}'.format(message_id))
+        room_link = soup.select_one('.room-name a')
+        if message is None or room_link is None or message.parent is None or message.parent.parent is None:
+            return None
+
+        user_link = message.parent.parent.select_one('.signature .username a')
+        user_match = None if user_link is None else re.match(r'/users/(-?\d+)', user_link.get('href') or '')
+        room_match = re.match(r'/rooms/(\d+)', room_link.get('href') or '')
+        if user_match is None or room_match is None:
+            return None
+
         content = self.session.get('https://chat.{}/message/{}?plain=true'.format(server, message_id)).text
-        return Message(server, message_id=message_id, room_id=room_id, user_id=user_id, content=content)
+        return Message(server, message_id=message_id, room_id=room_match[1], user_id=user_match[1], content=content)
+
+    def cached_message(self, message_id, server):
+        """
+        Get a message from the client's cache of recently received and fetched messages, without any network access.
+        :param message_id: the ID of the message to get
+        :param server: the server on which the message was posted
+        :return: Message, or None if it isn't cached
+        """
+        return self._message_cache.get((server, int(message_id)))
+
+    def get_message_async(self, message_id, server):
+        """
+        Get a message without blocking. Cached messages are returned immediately, and concurrent requests for the
+        same message share a single fetch.
+        :param message_id: the ID of the message to get
+        :param server: the server on which the message was posted
+        :return: a concurrent.futures.Future for the Message
+        """
+        message_id = int(message_id)
+        with self._message_fetches_lock:
+            key = (server, message_id)
+            cached = self._message_cache.get(key)
+            if cached is not None:
+                future = Future()
+                future.set_result(cached)
+                return future
+
+            if key not in self._message_fetches:
+                self._message_fetches[key] = self._message_fetch_executor.submit(self._fetch_message, message_id,
+                                                                                  server)
+            return self._message_fetches[key]
+
+    def _fetch_message(self, message_id, server):
+        """
+        Internal. Fetches a message for get_message_async and caches it. Errors are logged rather than raised.
+        :return: Message, or None if the message couldn't be fetched
+        """
+        try:
+            message = self.get_message(message_id, server)
+            if message is None:
+                self.logger.warning('Message {} on {} not found or not readable.'.format(message_id, server))
+            else:
+                self._message_cache.put((server, message_id), message)
+            return message
+        except requests.RequestException as ex:
+            self.logger.error('Failed to fetch message {} on {}: {!r}'.format(message_id, server, ex))
+            return None
+        finally:
+            with self._message_fetches_lock:
+                self._message_fetches.pop((server, message_id), None)
 
     def get_message_source(self, message_id, server):
         return self.session.get('https://chat.{}/message/{}?plain=true'.format(server, message_id)).text
@@ -113,7 +113,7 @@ class Event:
                             continue
                         initialization_props[field.target_prop] = event_dict[field.target_prop]
 
-                type_object = clazz(server, **initialization_props)
+                type_object = clazz(server, client=client, **initialization_props)
                 setattr(self, method_name, type_object)
 
         for k, v in event_dict.items():
@@ -1,5 +1,11 @@
+import threading
+import time
+from collections import OrderedDict
+
+
 class Helpers:
     _cache = {}
+    _store = None
 
     @classmethod
     def cached(cls, key, scope=None, func=None):
@@ -31,3 +37,112 @@ class Helpers:
             cls._cache[scope][key] = object
         else:
             cls._cache[key] = object
+
+    @classmethod
+    def use_store(cls, store):
+        cls._store = store
+
+    @classmethod
+    def stored(cls, scope, server, key):
+        """
+        Look up an entry in the persistent metadata store, if one is configured.
+        :return: a (data, is_stale) tuple, or None if there's no store or no such entry
+        """
+        if cls._store is None:
+            return None
+
+        entry = cls._store.get(scope, server, key)
+        if entry is None:
+            return None
+        data, fetched_at = entry
+        return data, cls._store.is_stale(scope, fetched_at)
+
+    @classmethod
+    def store(cls, scope, server, key, data):
+        if cls._store is not None:
+            cls._store.put(scope, server, key, data)
+
+
+class SeenSet:
+    def __init__(self, window=300, max_size=10000):
+        """
+        A bounded set of recently-seen keys. Keys are forgotten after window seconds, or earlier if more than max_size
+        keys have been seen since.
+        :param window: the number of seconds for which to remember a key
+        :param max_size: the maximum number of keys to remember at once
+        """
+        self.window = window
+        self.max_size = max_size
+        self.suppressed = 0
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, key):
+        """
+        Record a key as seen, and report whether it had already been seen within the window. Duplicates are counted
+        in SeenSet.suppressed.
+        :param key: any hashable key
+        :return: True if the key is new, False if it's a duplicate
+        """
+        with self._lock:
+            if self._add(key):
+                return True
+
+            self.suppressed += 1
+            return False
+
+    def add(self, key):
+        """
+        Record a key as seen without counting it as a duplicate if it already was, e.g. to pre-seed the set.
+        :param key: any hashable key
+        :return: None
+        """
+        with self._lock:
+            self._add(key)
+
+    def _add(self, key):
+        now = time.monotonic()
+        while len(self._seen) > 0 and next(iter(self._seen.values())) < now - self.window:
+            self._seen.popitem(last=False)
+
+        if key in self._seen:
+            return False
+
+        self._seen[key] = now
+        if len(self._seen) > self.max_size:
+            self._seen.popitem(last=False)
+        return True
+
+
+class LRUCache:
+    def __init__(self, max_size=1000):
+        """
+        A thread-safe key-value cache that holds at most max_size entries, evicting the least recently used first.
+        :param max_size: the maximum number of entries to hold
+        """
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Get a cached value and mark it as recently used.
+        :param key: any hashable key
+        :return: the cached value, or None if there isn't one
+        """
+        with self._lock:
+            if key not in self._entries:
+                return None
+
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
@@ -1,4 +1,6 @@
 import re
+import threading
+from concurrent.futures import Future
 import requests
 from bs4 import BeautifulSoup
 from stackl.helpers import Helpers
@@ -11,9 +13,20 @@ class Room:
         self.server = server
         self.url = "https://chat.{}/rooms/{}".format(server, kwargs.get('room_id'))
         self.owners = []
-        self.events = []
+        self._events = []
+        self._lazy_events = []
+        self._events_lock = threading.Lock()
 
-        Tasks.do(self._scrape_room_info)
+        stored = Helpers.stored('rooms', server, self.id)
+        if stored is None:
+            Tasks.do(self._scrape_room_info)
+        else:
+            data, is_stale = stored
+            self.name = data['name']
+            self.description = data['description']
+            Tasks.do(self._restore_owners, data['owners'])
+            if is_stale:
+                Tasks.do(self._scrape_room_info)
 
     def _scrape_room_info(self):
         info_page = requests.get("https://chat.{}/rooms/info/{}".format(self.server, self.id))
@@ -23,14 +36,70 @@ class Room:
         self.description = metadata_card.find('p').text
 
         owner_cards = room_soup.select('.room-ownercards .usercard')
-        for card in owner_cards:
-            user_id = card.get('id').split('-')[-1]
-            self.owners.append(Helpers.cached(int(user_id), 'users', lambda: User(self.server, user_id=user_id)))
+        owner_ids = [int(card.get('id').split('-')[-1]) for card in owner_cards]
+        self._restore_owners(owner_ids)
 
         Helpers.cache(self.id, 'rooms', self)
+        Helpers.store('rooms', self.server, self.id, {
+            'name': self.name,
+            'description': self.description,
+            'owners': owner_ids
+        })
+
+    def _restore_owners(self, owner_ids):
+        self.owners[:] = [Helpers.cached(user_id, 'users', lambda: User(self.server, user_id=user_id))
+                          for user_id in owner_ids]
+
+    @property
+    def events(self):
+        with self._events_lock:
+            if len(self._lazy_events) > 0:
+                self._events.extend(event if factory is None else factory(event)
+                                    for event, factory in self._lazy_events)
+                self._lazy_events = []
+
+            return self._events
 
     def add_events(self, events):
-        self.events.extend(events)
+        with self._events_lock:
+            self._lazy_events.extend((event, None) for event in events)
+
+    def add_lazy_events(self, events_data, factory):
+        """
+        Add raw event data to the room's events without building Event objects for it yet.
+        :param events_data: a list of raw event dicts
+        :param factory: a callable that takes a raw event dict and returns an Event; called when Room.events is read
+        :return: None
+        """
+        with self._events_lock:
+            self._lazy_events.extend((event_data, factory) for event_data in events_data)
+
+    def find_message(self, message_id):
+        """
+        Find a message in the room's event history. Events that haven't been built yet are searched by their raw data,
+        and only the matching event is built.
+        :param message_id: the ID of the message to find
+        :return: Message, or None if it isn't in the history
+        """
+        with self._events_lock:
+            for event in reversed(self._events):
+                message = getattr(event, 'message', None)
+                if message is not None and message.id == message_id:
+                    return message
+
+            for i in range(len(self._lazy_events) - 1, -1, -1):
+                event, factory = self._lazy_events[i]
+                if factory is not None:
+                    if event.get('message_id') is None or int(event['message_id']) != message_id:
+                        continue
+                    event = factory(event)
+                    self._lazy_events[i] = (event, None)
+
+                message = getattr(event, 'message', None)
+                if message is not None and message.id == message_id:
+                    return message
+
+        return None
 
     def __repr__(self):
         return '<Room {} ([{}])>'.format(self.id, ', '.join(self.__dict__.keys()))
@@ -44,7 +113,17 @@ class User:
         self.in_rooms = []
         self.owns_rooms = []
 
-        Tasks.do(self._scrape_user_info)
+        stored = Helpers.stored('users', server, self.id)
+        if stored is None:
+            Tasks.do(self._scrape_user_info)
+        else:
+            data, is_stale = stored
+            self.username = data['username']
+            self.is_moderator = data['is_moderator']
+            self.bio = data['bio']
+            Tasks.do(self._restore_rooms, data['in_rooms'], data['owns_rooms'])
+            if is_stale:
+                Tasks.do(self._scrape_user_info)
 
     def _scrape_user_info(self):
         user_page = requests.get(self.url)
@@ -57,18 +136,30 @@ class User:
         except IndexError:
             self.bio = ''
 
-        in_room_cards = user_soup.select('#user-roomcards-container .roomcard')
-        self.in_rooms.extend(self._initialize_rooms(in_room_cards))
-
-        owns_room_cards = user_soup.select('#user-owningcards .roomcard')
-        self.owns_rooms.extend(self._initialize_rooms(owns_room_cards))
+        in_room_ids = self._room_card_ids(user_soup.select('#user-roomcards-container .roomcard'))
+        owns_room_ids = self._room_card_ids(user_soup.select('#user-owningcards .roomcard'))
+        self._restore_rooms(in_room_ids, owns_room_ids)
 
         Helpers.cache(self.id, 'users', self)
+        Helpers.store('users', self.server, self.id, {
+            'username': self.username,
+            'is_moderator': self.is_moderator,
+            'bio': self.bio,
+            'in_rooms': in_room_ids,
+            'owns_rooms': owns_room_ids
+        })
+
+    def _restore_rooms(self, in_room_ids, owns_room_ids):
+        self.in_rooms[:] = self._initialize_rooms(in_room_ids)
+        self.owns_rooms[:] = self._initialize_rooms(owns_room_ids)
 
-    def _initialize_rooms(self, card_list):
-        for room_card in card_list:
-            room_id = room_card.get('id').split('-')[-1]
-            yield Helpers.cached(int(room_id), 'rooms', lambda: Room(self.server, room_id=room_id))
+    @staticmethod
+    def _room_card_ids(card_list):
+        return [int(room_card.get('id').split('-')[-1]) for room_card in card_list]
+
+    def _initialize_rooms(self, room_ids):
+        for room_id in room_ids:
+            yield Helpers.cached(room_id, 'rooms', lambda: Room(self.server, room_id=room_id))
 
     def __repr__(self):
         return '<User {} ([{}])>'.format(self.id, ', '.join(self.__dict__.keys()))
@@ -84,14 +175,60 @@ class Message:
                                    lambda: Room(server, room_id=kwargs.get('room_id')))
         self.user = Helpers.cached(int(kwargs.get('user_id')), 'users',
                                    lambda: User(server, user_id=kwargs.get('user_id')))
-        self.parent = (Helpers.cached(int(kwargs.get('parent_id')), 'messages',
-                                      lambda: kwargs.get('client').get_message(kwargs.get('parent_id'), server))
-                       if 'client' in kwargs and 'parent_id' in kwargs else None)
-        self.parent_id = kwargs.get('parent_id') if 'parent_id' in kwargs and 'client' not in kwargs else None
+        self.parent_id = int(kwargs.get('parent_id')) if kwargs.get('parent_id') is not None else None
+        self._parent = None
+        self._parent_future = None
+        self._client = kwargs.get('client')
         self._content_source = kwargs.get('content_source')
 
         self._setup_delegate_methods()
 
+    @property
+    def parent(self):
+        """
+        The message this one is a reply to, resolved on first access. Looks in the client's message cache and the
+        room's event history first, and only fetches from chat (blocking until the fetch is done) if that fails and
+        the message was created with a client. None if the parent can't be found or fetched; a failed fetch isn't
+        retried.
+        """
+        if self.parent_id is None:
+            return None
+
+        if self._parent is None and self._parent_future is None:
+            self._parent = self._find_local_parent()
+
+        if self._parent is None and self._client is not None:
+            if self._parent_future is None:
+                self._parent_future = self._client.get_message_async(self.parent_id, self.server)
+            self._parent = self._parent_future.result()
+
+        return self._parent
+
+    def prefetch_parent(self):
+        """
+        Start fetching the parent message in the background, if it isn't already available, so that a later access
+        to Message.parent doesn't block.
+        :return: a concurrent.futures.Future for the parent Message, or None if there's no parent or no client
+        """
+        if self.parent_id is None or self._client is None:
+            return None
+
+        if self._parent is None and self._parent_future is None:
+            self._parent = self._find_local_parent()
+
+        if self._parent is not None:
+            future = Future()
+            future.set_result(self._parent)
+            return future
+
+        if self._parent_future is None:
+            self._parent_future = self._client.get_message_async(self.parent_id, self.server)
+        return self._parent_future
+
+    def _find_local_parent(self):
+        cached = None if self._client is None else self._client.cached_message(self.parent_id, self.server)
+        return cached or self.room.find_message(self.parent_id)
+
     def reply(self, client, content):
         client.send(':{} {}'.format(self.id, content), room=self.room, server=self.server)
 
@@ -0,0 +1,94 @@
+import json
+import sqlite3
+import threading
+import time
+
+
+class MetadataStore:
+    DEFAULT_TTL = 86400
+    DEFAULT_MAX_ENTRIES = 10000
+
+    def __init__(self, path, ttl=None, max_entries=None):
+        """
+        Initialise a new on-disk metadata store, backed by SQLite.
+        :param path: the location of the SQLite database file; will be created if it doesn't exist
+        :param ttl: a dict of scope (e.g. 'users', 'rooms') to the number of seconds after which an entry in that
+                    scope is considered stale and should be refreshed; scopes not specified use DEFAULT_TTL
+        :param max_entries: a dict of scope to the maximum number of entries to keep in that scope; the least recently
+                            fetched entries are evicted first. Scopes not specified use DEFAULT_MAX_ENTRIES. The
+                            entry count is tracked per store, so if several stores or processes write to the same file,
+                            a scope may go over its limit until this store's own writes take it past the limit again;
+                            the real count is always re-read before anything is evicted
+        """
+        self.path = path
+        self.ttl = ttl or {}
+        self.max_entries = max_entries or {}
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute('CREATE TABLE IF NOT EXISTS entries (scope TEXT NOT NULL, server TEXT NOT NULL, '
+                               'key INTEGER NOT NULL, data TEXT NOT NULL, fetched_at REAL NOT NULL, '
+                               'PRIMARY KEY (scope, server, key))')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS entries_fetched_at ON entries (scope, fetched_at)')
+
+    def get(self, scope, server, key):
+        """
+        Get a stored entry.
+        :param scope: the scope the entry was stored under, e.g. 'users' or 'rooms'
+        :param server: the chat server the entry belongs to
+        :param key: the ID of the entry
+        :return: a (data, fetched_at) tuple, or None if there is no such entry
+        """
+        with self._lock:
+            row = self._conn.execute('SELECT data, fetched_at FROM entries WHERE scope = ? AND server = ? AND key = ?',
+                                     (scope, server, int(key))).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def put(self, scope, server, key, data, fetched_at=None):
+        """
+        Store an entry, replacing any existing entry with the same scope, server and key. Evicts the least recently
+        fetched entries in the scope if it has grown past its size limit.
+        :param scope: the scope to store the entry under, e.g. 'users' or 'rooms'
+        :param server: the chat server the entry belongs to
+        :param key: the ID of the entry
+        :param data: a JSON-serializable dict of metadata
+        :param fetched_at: the UNIX timestamp at which the data was fetched; defaults to now
+        :return: None
+        """
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        limit = self.max_entries.get(scope, self.DEFAULT_MAX_ENTRIES)
+        with self._lock, self._conn:
+            if scope not in self._counts:
+                self._counts[scope] = self._conn.execute('SELECT COUNT(*) FROM entries WHERE scope = ?',
+                                                         (scope,)).fetchone()[0]
+
+            exists = self._conn.execute('SELECT 1 FROM entries WHERE scope = ? AND server = ? AND key = ?',
+                                        (scope, server, int(key))).fetchone() is not None
+            self._conn.execute('INSERT OR REPLACE INTO entries (scope, server, key, data, fetched_at) '
+                               'VALUES (?, ?, ?, ?, ?)', (scope, server, int(key), json.dumps(data), fetched_at))
+            if not exists:
+                self._counts[scope] += 1
+
+            if self._counts[scope] > limit:
+                # Other stores may be writing to the same file, so don't trust the local count for deletion.
+                count = self._conn.execute('SELECT COUNT(*) FROM entries WHERE scope = ?', (scope,)).fetchone()[0]
+                if count > limit:
+                    self._conn.execute('DELETE FROM entries WHERE rowid IN (SELECT rowid FROM entries WHERE scope = ? '
+                                       'ORDER BY fetched_at ASC LIMIT ?)', (scope, count - limit))
+                self._counts[scope] = min(count, limit)
+
+    def is_stale(self, scope, fetched_at):
+        """
+        Check whether an entry fetched at the given time has outlived its scope's TTL.
+        :param scope: the scope the entry was stored under
+        :param fetched_at: the UNIX timestamp at which the entry was fetched
+        :return: Boolean
+        """
+        return time.time() - fetched_at > self.ttl.get(scope, self.DEFAULT_TTL)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()